@@ -1,17 +1,17 @@
 from __future__ import annotations
 
-from collections import OrderedDict
+import gzip
+import re
+import zlib
 from pathlib import Path
-from typing import TYPE_CHECKING, Literal, overload
-from xml.parsers.expat import ExpatError
+from typing import TYPE_CHECKING, Any, Literal, overload
 
-from xmltodict import parse as xmltodict_parse
 from xmltodict import unparse as xmltodict_unparse
 
 from nzb._exceptions import InvalidNZBError
 from nzb._models import NZB
-from nzb._parser import parse_doctype, parse_files, parse_metadata
-from nzb._utils import meta_constructor, realpath
+from nzb._parser import locate_head, parse_nzb, parse_xml
+from nzb._utils import meta_constructor, open_nzb_file, realpath
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -20,21 +20,28 @@ if TYPE_CHECKING:
 
     from nzb._types import StrPath
 
+XML_DECLARATION_REGEX = re.compile(r"^\s*<\?xml\s[^>]*\?>")
+"""`<?xml ... ?>` declaration at the very start of a document."""
+
 
 class NZBParser:
-    def __init__(self, nzb: str, *, encoding: str | None = "utf-8") -> None:
+    def __init__(self, nzb: str | bytes, *, encoding: str | None = "utf-8") -> None:
         """
         Initialize the NZBParser.
 
         Parameters
         ----------
-        nzb : str
-            NZB content as a string.
+        nzb : str | bytes
+            NZB content as a string or raw bytes.
+            Bytes are handed to the XML parser as is, without decoding them first.
         encoding : str, optional
-            Encoding of the NZB content.
+            Encoding of the NZB content. This overrides the encoding in the
+            XML declaration. Pass `None` to use the declared encoding instead
+            (`utf-8` if there is none) when parsing bytes.
         """
         self.__nzb = nzb
         self.__encoding = encoding
+        self.__nzb_file: Path | None = None
 
     def parse(self) -> NZB:
         """
@@ -51,12 +58,14 @@ class NZBParser:
             Raised if the input is not valid NZB.
         """
         try:
-            nzbdict = xmltodict_parse(self.__nzb, encoding=self.__encoding)
-        except ExpatError as error:
-            raise InvalidNZBError(error.args[0])
-
-        meta = parse_metadata(nzbdict)
-        files = parse_files(nzbdict)
+            if self.__nzb_file is None:
+                meta, files = parse_nzb(self.__nzb, encoding=self.__encoding)
+            else:
+                # Stream the file straight into the parser instead of reading it all into memory first.
+                with open_nzb_file(self.__nzb_file) as file:
+                    meta, files = parse_nzb(file, encoding=self.__encoding)
+        except (gzip.BadGzipFile, EOFError, zlib.error) as error:
+            raise InvalidNZBError(f"Gzip decompression error for file {self.__nzb_file}: {error}")
 
         return NZB(meta=meta, files=files)
 
@@ -64,21 +73,37 @@ class NZBParser:
     def from_file(cls, nzb: StrPath, *, encoding: str | None = "utf-8") -> Self:
         """
         Create an NZBParser instance from an NZB file path.
+        Gzipped NZBs (`.nzb.gz`) are also supported.
+
+        The file is not read into memory upfront, it's streamed
+        directly into the XML parser when [`NZBParser.parse`][nzb._core.NZBParser.parse] is called.
 
         Parameters
         ----------
         nzb : StrPath
             File path to the NZB.
         encoding : str, optional
-            Encoding of the NZB, defaults to `utf-8`.
+            Encoding of the NZB, defaults to `utf-8`. This overrides the encoding
+            in the XML declaration. Pass `None` to use the declared encoding instead.
 
         Returns
         -------
         NZBParser
-            An NZBParser instance initialized with the content of the specified NZB file.
+            An NZBParser instance initialized with the specified NZB file.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file does not exist.
         """
-        nzb = realpath(nzb).read_text(encoding=encoding)
-        return cls(nzb, encoding=encoding)
+        nzb_file = realpath(nzb)
+
+        if not nzb_file.is_file():
+            raise FileNotFoundError(nzb_file)
+
+        instance = cls("", encoding=encoding)
+        instance.__nzb_file = nzb_file
+        return instance
 
 
 class NZBMetaEditor:
@@ -96,15 +121,35 @@ class NZBMetaEditor:
         Raises
         ------
         InvalidNZBError
-            Raised if the input is not valid XML.
-            However, being valid XML doesn't guarantee it's a correctly structured NZB.
+            Raised if the input is not valid XML, or if its root isn't a non-empty `<nzb>...</nzb>`.
+            Only the `<head>` is looked at beyond that, so it doesn't guarantee the `<file>`s are valid.
         """
-        self.__nzb = nzb
         self.__encoding = encoding
-        try:
-            self.__nzbdict = xmltodict_parse(self.__nzb, encoding=self.__encoding)
-        except ExpatError as error:
-            raise InvalidNZBError(error.args[0])
+        # Only the <head> is ever edited, so rather than turning the entire NZB (which is mostly <file>s and <segment>s)
+        # into a dictionary, the NZB is only checked for well-formedness and just the <head> slice is parsed.
+        # Everything around it is written back untouched.
+        # A BOM would end up in front of the rewritten XML declaration, so it's dropped. The output's encoding is
+        # spelled out by the declaration anyway.
+        nzb_bytes = nzb.removeprefix("\ufeff").encode(self.__encoding)
+        root_start, head_start, head_end = locate_head(nzb_bytes, encoding=self.__encoding)
+        self.__head: dict[str, Any] | None = None
+        # Serialized output, reset by anything that touches `self.__head`.
+        self.__str: str | None = None
+
+        if head := nzb_bytes[head_start:head_end].strip():
+            # The <head> is parsed behind the NZB's own prolog, so that entity references in it
+            # are handled exactly like they are in the full NZB (e.g, skipped under the NZB DOCTYPE).
+            # An empty <head/> is parsed as None, but it's still there.
+            self.__head = parse_xml(nzb_bytes[:root_start] + head, encoding=self.__encoding)["head"] or {}
+
+        # Everything around the <head> is constant, so it's prepared once here instead of on every serialization.
+        # The NZB is written back in `self.__encoding`, so the XML declaration has to say so.
+        declaration = f'<?xml version="1.0" encoding="{self.__encoding}"?>'
+        prefix, declared = XML_DECLARATION_REGEX.subn(
+            declaration, nzb_bytes[:head_start].decode(self.__encoding), count=1
+        )
+        self.__prefix = prefix if declared else f"{declaration}\n{prefix}"
+        self.__suffix = nzb_bytes[head_end:].decode(self.__encoding)
 
     def __get_meta(self) -> list[dict[str, str]] | dict[str, str] | None:
         """
@@ -115,7 +160,19 @@ class NZBMetaEditor:
         list[dict[str, str]] | dict[str, str] | None
             The metadata as a list of dictionaries, a single dictionary, or `None` if not found.
         """
-        return self.__nzbdict.get("nzb", {}).get("head", {}).get("meta")  # type: ignore
+        return self.__head.get("meta") if self.__head else None
+
+    def __set_meta(self, meta: list[dict[str, str]]) -> None:
+        """
+        Replace the metadata in the NZB, keeping anything else in the `<head>` as is.
+
+        Parameters
+        ----------
+        meta : list[dict[str, str]]
+            The new metadata.
+        """
+        self.__head = {**(self.__head or {}), "meta": meta}
+        self.__str = None
 
     def set(
         self,
@@ -149,12 +206,8 @@ class NZBMetaEditor:
         if title is None and passwords is None and tags is None and category is None:
             return self
 
-        nzb = OrderedDict(self.__nzbdict["nzb"])
-
-        nzb["head"] = {}
-        nzb["head"]["meta"] = meta_constructor(title=title, passwords=passwords, tags=tags, category=category)
-        nzb.move_to_end("file")
-        self.__nzbdict["nzb"] = nzb
+        self.__head = {"meta": meta_constructor(title=title, passwords=passwords, tags=tags, category=category)}
+        self.__str = None
         return self
 
     def append(
@@ -193,11 +246,11 @@ class NZBMetaEditor:
         elif isinstance(meta, dict):
             new_meta = [meta]
             new_meta.extend(meta_constructor(title=title, passwords=passwords, tags=tags, category=category))
-            self.__nzbdict["nzb"]["head"]["meta"] = new_meta
+            self.__set_meta(new_meta)
 
         else:
             meta.extend(meta_constructor(title=title, passwords=passwords, tags=tags, category=category))
-            self.__nzbdict["nzb"]["head"]["meta"] = meta
+            self.__set_meta(meta)
 
         return self
 
@@ -235,7 +288,7 @@ class NZBMetaEditor:
                 return self
         else:
             new_meta = [row for row in meta if row["@type"] != key]
-            self.__nzbdict["nzb"]["head"]["meta"] = new_meta
+            self.__set_meta(new_meta)
             return self
 
     def clear(self) -> Self:
@@ -247,11 +300,8 @@ class NZBMetaEditor:
         Self
             Returns itself.
         """
-        try:
-            del self.__nzbdict["nzb"]["head"]
-        except KeyError:
-            pass
-
+        self.__head = None
+        self.__str = None
         return self
 
     def save(self, filename: StrPath | None = None, *, overwrite: bool = False) -> Path:
@@ -294,18 +344,29 @@ class NZBMetaEditor:
             outfile = realpath(filename)
 
         outfile.parent.mkdir(parents=True, exist_ok=True)
-        unparsed = xmltodict_unparse(self.__nzbdict, encoding=self.__encoding, pretty=True, indent="    ")
-
-        if doctype := parse_doctype(self.__nzb):
-            # see: https://github.com/martinblech/xmltodict/issues/351
-            nzb = unparsed.splitlines(keepends=True)
-            nzb.insert(1, f"{doctype}\n")
-            with open(outfile, "w", encoding=self.__encoding) as f:
-                f.writelines(nzb)
+        outfile.write_text(self.to_str(), encoding=self.__encoding)
+        return outfile
+
+    def to_str(self) -> str:
+        """
+        Return the edited NZB as a string.
+
+        Returns
+        -------
+        str
+            The edited NZB.
+        """
+        if self.__str is not None:
+            return self.__str
+
+        if self.__head is None:
+            head = ""
         else:
-            outfile.write_text(unparsed, encoding=self.__encoding)
+            unparsed = xmltodict_unparse({"head": self.__head}, full_document=False, pretty=True, indent="    ")
+            head = "".join(f"\n    {line}" for line in unparsed.splitlines())
 
-        return outfile
+        self.__str = self.__prefix + head + self.__suffix
+        return self.__str
 
     @classmethod
     def from_file(cls, nzb: StrPath, *, encoding: str = "utf-8") -> Self:
@@ -7,13 +7,19 @@ from os.path import splitext
 from natsort import natsorted
 from pydantic import BaseModel, ByteSize, ConfigDict
 
-from nzb._types import UTCDateTime
+from nzb._types import PooledStr, UTCDateTime
 from nzb._utils import (
     name_is_par2,
     name_is_rar,
     stem_is_obfuscated,
 )
 
+SUBJECT_QUOTED_NAME_REGEX = re.compile(r'"([^"]*)"')
+"""File name in between quotes in a subject, e.g, `[1/5] - "Big Buck Bunny - S01E01.mkv" yEnc (1/24)`."""
+
+SUBJECT_NAME_REGEX = re.compile(r"\b([\w\-+()' .,]+(?:\[[\w\-/+()' .,]*][\w\-+()' .,]*)*\.[A-Za-z0-9]{2,4})\b")
+"""Anything that looks like a file name with an extension in a subject, for when there are no quotes."""
+
 
 class ParentModel(BaseModel):
     model_config = ConfigDict(frozen=True, str_strip_whitespace=True)
@@ -71,7 +77,7 @@ class Segment(ParentModel):
 class File(ParentModel):
     """Represents a complete file, consisting of segments that make up a file."""
 
-    poster: str
+    poster: PooledStr
     """The poster of the file."""
 
     datetime: UTCDateTime
@@ -80,7 +86,7 @@ class File(ParentModel):
     subject: str
     """The subject of the file."""  # Ideally it contains the filename, segment count, and other relevant information.
 
-    groups: tuple[str, ...]  # Every file must have atleast one group.
+    groups: tuple[PooledStr, ...]  # Every file must have atleast one group.
     """Groups that reference the file."""
 
     segments: tuple[Segment, ...]  # Every file must have atleast one segment.
@@ -98,11 +104,9 @@ class File(ParentModel):
         May return an empty string if it fails to extract the name.
         """
         # https://github.com/sabnzbd/sabnzbd/blob/02b4a116dd4b46b2d2f33f7bbf249f2294458f2e/sabnzbd/nzbstuff.py#L104-L106
-        if parsed := re.search(r'"([^"]*)"', self.subject):
+        if parsed := SUBJECT_QUOTED_NAME_REGEX.search(self.subject):
             return parsed.group(1).strip()
-        elif parsed := re.search(
-            r"\b([\w\-+()' .,]+(?:\[[\w\-/+()' .,]*][\w\-+()' .,]*)*\.[A-Za-z0-9]{2,4})\b", self.subject
-        ):
+        elif parsed := SUBJECT_NAME_REGEX.search(self.subject):
             return parsed.group(1).strip()
         else:
             return ""
@@ -209,12 +213,7 @@ class NZB(ParentModel):
         """
         Tuple of unique groups across all the files in the NZB.
         """
-        groupset: set[str] = set()
-
-        for file in self.files:
-            groupset.update(file.groups)
-
-        return tuple(natsorted(groupset))
+        return tuple(natsorted({group for file in self.files for group in file.groups}))
 
     @cached_property
     def par2_size(self) -> ByteSize:
@@ -5,18 +5,127 @@ https://web.archive.org/web/20240709113825/https://sabnzbd.org/wiki/extra/nzb-sp
 
 from __future__ import annotations
 
-import re
-from typing import Any, TypeAlias, Union, cast
+from typing import TYPE_CHECKING, Any
+from xml.parsers.expat import ExpatError, ParserCreate
 
 from natsort import natsorted
+from pydantic import ValidationError
+from xmltodict import parse as xmltodict_parse
 
 from nzb._exceptions import InvalidNZBError
 from nzb._models import File, Meta, Segment
 
+if TYPE_CHECKING:
+    from io import BufferedIOBase
 
-def parse_metadata(nzb: dict[str, Any]) -> Meta:
+REQUIRED_FILE_ATTRIBUTES = frozenset(("poster", "date", "subject"))
+"""Attributes that every `<file>` must have."""
+
+
+def parse_xml(nzb: bytes, encoding: str = "utf-8") -> dict[str, Any]:
+    """
+    Parses a snippet of an NZB that's already been checked by [`locate_head`][nzb._parser.locate_head]
+    (i.e, the `<head>...</head>` slice, behind the NZB's own prolog) into a dictionary.
+    """
+    return xmltodict_parse(nzb, encoding=encoding)
+
+
+def forbid_entities(*args: object) -> None:
+    """Expat handler that rejects entity declarations, mirroring `disable_entities=True` in xmltodict."""
+    raise InvalidNZBError("Entity declarations are not allowed in an NZB!")
+
+
+def locate_head(nzb: bytes, encoding: str = "utf-8") -> tuple[int, int, int]:
+    """
+    Checks that the NZB is well-formed XML and finds where its root `<nzb>` starts, along with the byte span
+    of its `<head>...</head>` field, including any whitespace preceding it. If there's no head, the span is
+    empty and sits right after the opening `<nzb>` tag, which is where a new head would go.
+
+    The offsets come from expat itself, so a `<head>` inside a comment, CDATA, or an attribute value
+    is never mistaken for the real one.
+
+    ```xml
+    <?xml version="1.0" encoding="iso-8859-1" ?>
+    <!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
+    <nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
+        <head>
+            <meta type="title">Your File!</meta>
+        </head>
+        <file>[...]</file>
+    </nzb>
+    ```
     """
-    Parses the `<meta>...</meta>` field present in an NZB.
+    parser = ParserCreate(encoding)
+    parser.EntityDeclHandler = forbid_entities
+
+    depth = 0
+    root: str | None = None
+    # Byte offsets of the first <head>, and of the start and end of the opening <nzb> tag.
+    head_start: int | None = None
+    head_end: int | None = None
+    root_start = 0
+    root_end: int | None = None
+    # Expat only reports where an event starts, so the end of a tag is wherever the next event starts.
+    # That's either the end of the opening <nzb> tag or the end of the <head>.
+    pending: str | None = None
+
+    def mark(*args: object) -> None:
+        nonlocal pending, head_end, root_end
+        if pending == "root":
+            root_end = parser.CurrentByteIndex
+        elif pending == "head":
+            head_end = parser.CurrentByteIndex
+        pending = None
+
+    def start(name: str, attributes: dict[str, str]) -> None:
+        nonlocal depth, root, root_start, head_start, pending
+        mark()
+        depth += 1
+        if depth == 1:
+            root = name
+            root_start = parser.CurrentByteIndex
+            pending = "root"
+        elif depth == 2 and name == "head" and head_start is None:
+            head_start = parser.CurrentByteIndex
+
+    def end(name: str) -> None:
+        nonlocal depth, pending
+        if depth == 1 and pending == "root":
+            # Nothing inside the root, not even whitespace, so there's nowhere to put a <head>.
+            # That's either <nzb/> or <nzb></nzb>, neither of which is an NZB.
+            raise InvalidNZBError("Missing or malformed <nzb>...</nzb>!")
+        mark()
+        if depth == 2 and name == "head" and head_end is None:
+            pending = "head"
+        depth -= 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = mark
+    parser.CommentHandler = mark
+    parser.ProcessingInstructionHandler = mark
+    parser.StartCdataSectionHandler = mark
+    parser.SkippedEntityHandler = mark
+
+    try:
+        parser.Parse(nzb, True)
+    except ExpatError as error:
+        raise InvalidNZBError(error.args[0])
+
+    if root != "nzb" or root_end is None:
+        raise InvalidNZBError("Missing or malformed <nzb>...</nzb>!")
+
+    if head_start is None or head_end is None:
+        return root_start, root_end, root_end
+
+    # Take the indentation (and newline) before the <head> along with it.
+    stripped = len(nzb[:head_start].rstrip())
+    return root_start, max(stripped, root_end), head_end
+
+
+def parse_metadata(meta: list[dict[str, str]]) -> Meta:
+    """
+    Parses the `<meta>...</meta>` fields present in the `<head>` of an NZB.
 
     ```xml
     <?xml version="1.0" encoding="iso-8859-1" ?>
@@ -32,26 +141,11 @@ def parse_metadata(nzb: dict[str, Any]) -> Meta:
     ```
     """
 
-    meta = nzb.get("nzb", {}).get("head", {}).get("meta")
-    # There's 3 possible things that we can get from the above here:
-    # - A list of dictionaries if there's more than 1 meta field present
-    # - A dictionary if there's only one meta field present
-    # - None if there's no meta field
-
-    # Here's the type representation of the three possible cases that we need to handle
-    MetaFieldType: TypeAlias = Union[list[dict[str, str]], dict[str, str], None]
-
-    # Explicit cast to tell typecheckers the return type based on the above 3 points.
-    meta = cast(MetaFieldType, meta)
-
-    if meta is None:
+    if not meta:
         # Meta is optional, so we will not error
         # just return an instance with all values set to None
         return Meta()
 
-    if isinstance(meta, dict):
-        meta = [meta]
-
     passwordset = set()
     tagset = set()
     title = None
@@ -88,145 +182,188 @@ def parse_metadata(nzb: dict[str, Any]) -> Meta:
     )
 
 
-def parse_segments(segmentdict: dict[str, list[dict[str, str]] | dict[str, str] | None] | None) -> tuple[Segment, ...]:
+class NZBHandler:
     """
-    Parses the `<segments>...</segments>` field present in an NZB.
-
-    There's 3 possible things that we can get here:
-    - A list of dictionaries if there's more than 1 segment field present
-    - A dictionary if there's only one segment field present
-    - None if there's no segment field
+    Expat handlers that build the [`File`][nzb._models.File]s of an NZB straight from the parser events,
+    without turning the NZB into a dictionary first. Each `<file>` becomes a `File` as soon as it's closed,
+    so only the `<file>` that's currently being parsed is ever held as raw values.
 
     ```xml
     <?xml version="1.0" encoding="iso-8859-1" ?>
     <!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
     <nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
+        <head>
+            <meta type="title">Your File!</meta>
+        </head>
         <file poster="Joe Bloggs &lt;bloggs@nowhere.example&gt;" date="1071674882" subject="Here's your file!  abc-mr2a.r01 (1/2)">
-            <groups>[...]</groups>
+            <groups>
+                <group>alt.binaries.newzbin</group>
+            </groups>
             <segments>
                 <segment bytes="102394" number="1">123456789abcdef@news.newzbin.com</segment>
-                <segment bytes="4501" number="2">987654321fedbca@news.newzbin.com</segment>
             </segments>
         </file>
     </nzb>
     ```
     """
-    # It's nested or possibly None
-    segments = segmentdict.get("segment") if segmentdict else None
-
-    if segments is None:
-        raise InvalidNZBError("Missing or malformed <segments>...</segments>!")
 
-    if isinstance(segments, dict):
-        segments = [segments]
+    def __init__(self) -> None:
+        self.path: list[str] = []
+        """Names of the currently open elements."""
+        self.attributes: dict[str, str] = {}
+        """Attributes of the most recently opened element."""
+        self.text = ""
+        """Text of the most recently opened element."""
+
+        self.meta: list[dict[str, str]] = []
+        """`<meta>` fields, as `{"@type": ..., "#text": ...}` for [`parse_metadata`][nzb._parser.parse_metadata]."""
+        self.files: set[File] = set()
+        self.strings: dict[str, str] = {}
+        """
+        Posters and groups seen so far, so that repeated values share one object across every `File`.
+        It's passed to pydantic as the validation context, since it would otherwise copy them while stripping.
+        """
+
+        # State of the <file> that's currently being parsed.
+        self.file: dict[str, str] = {}
+        self.groups: set[str] = set()
+        self.segments: set[Segment] | None = None
+
+    def start(self, name: str, attributes: dict[str, str]) -> None:
+        path = self.path
+        path.append(name)
+        self.attributes = attributes
+        self.text = ""
+
+        if path[0] != "nzb":
+            return
+
+        if name == "file" and len(path) == 2:
+            self.file = attributes
+            self.groups = set()
+            self.segments = None
+
+        elif name == "segment" and len(path) == 4 and path[1] == "file" and path[2] == "segments":
+            # Unlike groups, an NZB with <segment> elements that are all broken is still an NZB,
+            # it's the absence of any <segment> element that makes it invalid.
+            if self.segments is None:
+                self.segments = set()
+
+    def characters(self, data: str) -> None:
+        # buffer_text is enabled, but text can still arrive in multiple chunks (e.g, around `&amp;`).
+        self.text += data
+
+    def end(self, name: str) -> None:
+        path = self.path
+
+        if path[0] == "nzb":
+            depth = len(path)
+
+            if depth == 4 and path[1] == "file":
+                if name == "segment" and path[2] == "segments":
+                    self.add_segment()
+                elif name == "group" and path[2] == "groups":
+                    if group := self.text.strip():
+                        self.groups.add(group)
+
+            elif depth == 3 and name == "meta" and path[1] == "head":
+                meta = {f"@{key}": value for key, value in self.attributes.items()}
+                if text := self.text.strip():
+                    meta["#text"] = text
+                self.meta.append(meta)
+
+            elif depth == 2 and name == "file":
+                self.add_file()
+
+        path.pop()
+        # Text after a closing tag belongs to the parent, and is just whitespace in an NZB.
+        self.text = ""
+
+    def add_segment(self) -> None:
+        attributes = self.attributes
 
-    segmentset: set[Segment] = set()
-
-    for segment in segments:
         try:
-            size = segment["@bytes"]
-            number = segment["@number"]
-            message_id = segment["#text"]
+            size = attributes["bytes"]
+            number = attributes["number"]
         except KeyError:
             # This segment is broken
             # We do not error here because a few missing
             # segments don't invalidate the nzb.
-            continue
-
-        segmentset.add(Segment(size=size, number=number, message_id=message_id))  # type: ignore
+            return
 
-    return tuple(natsorted(segmentset, key=lambda seg: seg.number))
+        if not (message_id := self.text.strip()):
+            return
 
+        try:
+            self.segments.add(Segment(size=size, number=number, message_id=message_id))  # type: ignore
+        except ValidationError:
+            raise InvalidNZBError("Missing or malformed <file>...</file>!")
 
-def parse_files(nzb: dict[str, Any]) -> tuple[File, ...]:
-    """
-    Parses the `<file>...</file>` field present in an NZB.
-
-    ```xml
-    <?xml version="1.0" encoding="iso-8859-1" ?>
-    <!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
-    <nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
-        <file poster="Joe Bloggs &lt;bloggs@nowhere.example&gt;" date="1071674882" subject="Here's your file!  abc-mr2a.r01 (1/2)">
-            <groups>[...]</groups>
-            <segments>[...]</segments>
-        </file>
-    </nzb>
-    ```
-    """
-
-    files = nzb.get("nzb", {}).get("file")
-    # There's 3 possible things that we can get from the above here:
-    # - A list of dictionaries if there's more than 1 file field present, i.e, list[dict[str, str]]
-    # - A dictionary if there's only one file field present, i.e, dict[str, str]
-    # - None if there's no file field
-
-    # Here's the type representation of the three possible cases that we need to handle
-    FileFieldType: TypeAlias = Union[list[dict[str, str]], dict[str, str], None]
-
-    # Explicit cast to tell typecheckers the return type based on the above 3 points.
-    files = cast(FileFieldType, files)
-
-    if files is None:
-        raise InvalidNZBError("Missing or malformed <file>...</file>!")
-
-    if isinstance(files, dict):
-        files = [files]
-
-    fileset: set[File] = set()
-
-    for file in files:
-        groupset: set[str] = set()
-
-        groups = file.get("groups").get("group") if file.get("groups") else None
-        # There's 3 possible things that we can get from the above here:
-        # - A list of strings if there's more than 1 group present, i.e, list[str]
-        # - A string if there's only one file field present, i.e, str
-        # - None if there's no group field
-
-        # Here's the type representation of the three possible cases that we need to handle
-        GroupFieldType: TypeAlias = Union[list[str], str, None]
+    def add_file(self) -> None:
+        file = self.file
 
-        # Explicit cast to tell typecheckers the return type based on the above 3 points.
-        groups = cast(GroupFieldType, groups)
+        # A single set difference, instead of looking up each attribute separately.
+        if missing := REQUIRED_FILE_ATTRIBUTES.difference(file):
+            raise InvalidNZBError(f"Missing or malformed '{min(missing)}' attribute in <file>...</file>!")
 
-        if groups is None:
+        if not self.groups:
             raise InvalidNZBError("Missing or malformed <groups>...</groups>!")
 
-        if isinstance(groups, str):
-            groupset.add(groups)
-        else:
-            groupset.update(groups)
-
-        fileset.add(
-            File(
-                poster=file.get("@poster"),
-                datetime=file.get("@date"),
-                subject=file.get("@subject"),
-                groups=natsorted(groupset),  # type: ignore
-                segments=parse_segments(file.get("segments")),
-            )
-        )
+        if self.segments is None:
+            raise InvalidNZBError("Missing or malformed <segments>...</segments>!")
 
-    return tuple(natsorted(fileset, key=lambda file: file.subject))
+        try:
+            self.files.add(
+                File.model_validate(
+                    {
+                        "poster": file["poster"],
+                        "datetime": file["date"],
+                        "subject": file["subject"],
+                        "groups": natsorted(self.groups),
+                        # Segment numbers are already integers, so a natural sort would only add overhead.
+                        "segments": sorted(self.segments, key=lambda seg: seg.number),
+                    },
+                    context=self.strings,
+                )
+            )
+        except ValidationError:
+            # e.g, an unparsable date
+            raise InvalidNZBError("Missing or malformed <file>...</file>!")
 
 
-def parse_doctype(nzb: str) -> str | None:
+def parse_nzb(nzb: str | bytes | BufferedIOBase, encoding: str | None = "utf-8") -> tuple[Meta, tuple[File, ...]]:
     """
-    Parses the DOCTYPE from an NZB file.
+    Parses the `<meta>...</meta>` and `<file>...</file>` fields present in an NZB.
 
-    Quoting https://www.oreilly.com/library/view/xml-pocket-reference/9780596100506/ch01s02s09.html:
-    "A document type or DOCTYPE declaration provides information to a validating XML parser about how to validate an XML document.
-    The DOCTYPE keyword appears first; then the document, or root, element of the document being validated is identified,
-    followed by either a SYSTEM or PUBLIC identifier."
+    Input that's already in memory is parsed in one go, file objects are streamed
+    into the parser chunk by chunk.
 
-    Example:
-    ```xml
-    <?xml version="1.0" encoding="UTF-8"?>
-    <!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
-    <nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
-    ...
-    </nzb>
-    ```
+    The handlers are registered on expat directly, so any parser errors are normalized to
+    [`InvalidNZBError`][nzb._exceptions.InvalidNZBError] here, same as [`locate_head`][nzb._parser.locate_head].
     """
-    doctype = re.search(r"<!DOCTYPE nzb.*>", nzb, re.IGNORECASE)
-    return doctype.group() if doctype else None
+    if isinstance(nzb, str):
+        # The string is encoded here, so the parser has to decode it with that same encoding
+        # rather than whatever the XML declaration claims.
+        encoding = encoding or "utf-8"
+        nzb = nzb.encode(encoding)
+
+    handler = NZBHandler()
+    parser = ParserCreate(encoding)
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.characters
+    parser.EntityDeclHandler = forbid_entities
+
+    try:
+        if isinstance(nzb, bytes):
+            parser.Parse(nzb, True)
+        else:
+            parser.ParseFile(nzb)
+    except ExpatError as error:
+        raise InvalidNZBError(error.args[0])
+
+    if not handler.files:
+        raise InvalidNZBError("Missing or malformed <file>...</file>!")
+
+    return parse_metadata(handler.meta), tuple(natsorted(handler.files, key=lambda file: file.subject))
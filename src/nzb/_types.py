@@ -4,10 +4,20 @@ from datetime import datetime, timezone
 from os import PathLike
 from typing import Annotated, TypeAlias, Union
 
-from pydantic import AfterValidator
+from pydantic import AfterValidator, ValidationInfo
 
 StrPath: TypeAlias = Union[str, PathLike[str]]
 """String or pathlib.Path"""
 
 UTCDateTime = Annotated[datetime, AfterValidator(lambda dt: dt.astimezone(timezone.utc))]
 """datetime that's always in UTC."""
+
+
+def pool_str(value: str, info: ValidationInfo) -> str:
+    # The pool is handed over as the validation context by the parser, and only lives as long as a single parse.
+    pool: dict[str, str] | None = info.context
+    return value if pool is None else pool.setdefault(value, value)
+
+
+PooledStr = Annotated[str, AfterValidator(pool_str)]
+"""str that's shared with equal values validated against the same pool (e.g, the same poster on every file)."""
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import gzip
 import re
 from functools import cache
 from pathlib import Path
@@ -7,6 +8,7 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
+    from io import BufferedIOBase
     from typing import Callable, ParamSpec, TypeVar
 
     from nzb._types import StrPath
@@ -18,6 +20,17 @@ if TYPE_CHECKING:
         return user_function
 
 
+RAR_VOLUME_REGEX = re.compile(r"\.[r-v]\d\d$")
+"""Old style split archive extensions (`.r00`, `.s00`, etc), matched against a lowercased name."""
+
+# Patterns used to detect obfuscated file stems, see `stem_is_obfuscated`.
+HEX32_REGEX = re.compile(r"^[a-f0-9]{32}$")
+HEX40_DOTS_REGEX = re.compile(r"^[a-f0-9.]{40,}$")
+HEX30_REGEX = re.compile(r"[a-f0-9]{30}")
+SQUARE_BRACKETS_REGEX = re.compile(r"\[\w+\]")
+ABC_XYZ_REGEX = re.compile(r"^abc\.xyz")
+
+
 def realpath(path: StrPath, /) -> Path:
     """
     Canonicalize a given path.
@@ -25,6 +38,21 @@ def realpath(path: StrPath, /) -> Path:
     return Path(path).expanduser().resolve()
 
 
+def open_nzb_file(path: Path, /) -> BufferedIOBase:
+    """
+    Open an NZB file for reading in binary mode.
+    Gzipped NZBs (`.nzb.gz`) are detected by their magic number
+    and transparently decompressed as they are read.
+    """
+    with path.open("rb") as file:
+        magic = file.read(2)
+
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    else:
+        return path.open("rb")
+
+
 def meta_constructor(
     title: str | None = None,
     passwords: Iterable[str] | str | None = None,
@@ -35,24 +63,23 @@ def meta_constructor(
     Constructor that constructs valid `<meta> .. </meta>` fields
     """
 
+    # A single string is a single value, not an iterable of characters (and an empty one is no value).
+    if isinstance(passwords, str):
+        passwords = (passwords,) if passwords else ()
+
+    if isinstance(tags, str):
+        tags = (tags,) if tags else ()
+
     meta = []
 
     if title:
         meta.append({"@type": "title", "#text": title})
 
     if passwords:
-        if isinstance(passwords, str):
-            meta.append({"@type": "password", "#text": passwords})
-        else:
-            for password in passwords:
-                meta.append({"@type": "password", "#text": password})
+        meta.extend({"@type": "password", "#text": password} for password in passwords)
 
     if tags:
-        if isinstance(tags, str):
-            meta.append({"@type": "tag", "#text": tags})
-        else:
-            for tag in tags:
-                meta.append({"@type": "tag", "#text": tag})
+        meta.extend({"@type": "tag", "#text": tag} for tag in tags)
 
     if category:
         meta.append({"@type": "category", "#text": category})
@@ -73,11 +100,7 @@ def name_is_par2(filename: str) -> bool:
     -------
     bool
     """
-    if not filename:
-        return False
-    else:
-        parsed = re.search(r"\.par2$", filename, re.IGNORECASE)
-        return True if parsed else False
+    return filename.lower().endswith(".par2")
 
 
 @cache
@@ -95,14 +118,11 @@ def name_is_rar(filename: str) -> bool:
 
     Notes
     -----
-    The regex used here was copy-pasted from SABnzbd:
+    This matches the same extensions (`.rar` and `.r00` through `.v99`, case insensitive) as the regex used by SABnzbd:
     https://github.com/sabnzbd/sabnzbd/blob/02b4a116dd4b46b2d2f33f7bbf249f2294458f2e/sabnzbd/nzbstuff.py#L107
     """
-    if not filename:
-        return False
-    else:
-        parsed = re.search(r"(\.rar|\.r\d\d|\.s\d\d|\.t\d\d|\.u\d\d|\.v\d\d)$", filename, re.IGNORECASE)
-        return True if parsed else False
+    name = filename.lower()
+    return name.endswith(".rar") or RAR_VOLUME_REGEX.search(name) is not None
 
 
 @cache
@@ -131,21 +151,21 @@ def stem_is_obfuscated(filestem: str) -> bool:  # pragma: no cover
     # First: the patterns that are certainly obfuscated:
 
     # ...blabla.H.264/b082fa0beaa644d3aa01045d5b8d0b36.mkv is certainly obfuscated
-    if re.findall(r"^[a-f0-9]{32}$", filestem):
+    if HEX32_REGEX.findall(filestem):
         # exactly 32 hex digits, so:
         return True
 
     # 0675e29e9abfd2.f7d069dab0b853283cc1b069a25f82.6547
-    if re.findall(r"^[a-f0-9.]{40,}$", filestem):
+    if HEX40_DOTS_REGEX.findall(filestem):
         return True
 
     # "[BlaBla] something [More] something 5937bc5e32146e.bef89a622e4a23f07b0d3757ad5e8a.a02b264e [Brrr]"
     # So: square brackets plus 30+ hex digit
-    if re.findall(r"[a-f0-9]{30}", filestem) and len(re.findall(r"\[\w+\]", filestem)) >= 2:
+    if HEX30_REGEX.findall(filestem) and len(SQUARE_BRACKETS_REGEX.findall(filestem)) >= 2:
         return True
 
     # /some/thing/abc.xyz.a4c567edbcbf27.BLA is certainly obfuscated
-    if re.findall(r"^abc\.xyz", filestem):
+    if ABC_XYZ_REGEX.findall(filestem):
         # ... which we consider as obfuscated:
         return True
 
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import copy
+from functools import cache
+from pathlib import Path
+
+import pytest
+
+from nzb import NZB, NZBMetaEditor, NZBParser
+
+NZB_DIR = Path(__file__).parent / "__nzbs__"
+
+
+class NZBFiles:
+    """
+    The NZBs in `tests/__nzbs__/`, each read and parsed at most once per process
+    (i.e, once per pytest-xdist worker).
+    """
+
+    @cache
+    def read(self, name: str) -> bytes:
+        """Raw bytes of the NZB."""
+        return (NZB_DIR / name).read_bytes()
+
+    @cache
+    def parse(self, name: str) -> NZB:
+        """Parsed NZB, gzipped or not. It's shared between tests, which is fine since the models are immutable."""
+        return NZBParser.from_file(NZB_DIR / name).parse()
+
+    def editor(self, name: str) -> NZBMetaEditor:
+        """A fresh NZBMetaEditor for the NZB. It's a deep copy of a cached one, so it's safe to mutate."""
+        return copy.deepcopy(self.__editor(name))
+
+    @cache
+    def __editor(self, name: str) -> NZBMetaEditor:
+        return NZBMetaEditor(self.read(name).decode("utf-8"))
+
+
+@pytest.fixture(scope="session")
+def nzb_files() -> NZBFiles:
+    """Cached access to the NZBs in `tests/__nzbs__/`."""
+    return NZBFiles()
@@ -1,49 +1,111 @@
 from __future__ import annotations
 
+import re
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, TypeVar
 
 import pytest
 
 from nzb import InvalidNZBError, NZBMetaEditor, NZBParser
 
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+    from tests.conftest import NZBFiles
+
+E = TypeVar("E", bound=BaseException)
+
 nzbs = Path("tests/__nzbs__/")
 
-invalid_xml = """\
-<?xml version="1.0" encoding="iso-8859-1" ?>
-<!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
-<nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
+files_error = "Missing or malformed <file>...</file>!"
+groups_error = "Missing or malformed <groups>...</groups>!"
+segments_error = "Missing or malformed <segments>...</segments>!"
+entity_error = "Entity declarations are not allowed in an NZB!"
+# The only message that's an actual pattern, compiled once at import.
+xml_error = re.compile(r"^no element found: line \d+, column \d+$")
+
+
+@contextmanager
+def raises_with(exception: type[E], predicate: Callable[[E], bool]) -> Iterator[None]:
+    """
+    Like `pytest.raises(..., match=...)`, but the raised exception is checked with a plain predicate,
+    skipping the regex compilation and search.
+    """
+    try:
+        yield
+    except exception as error:
+        assert predicate(error), f"{error!r} does not satisfy the predicate"
+    else:
+        pytest.fail(f"DID NOT RAISE {exception.__name__}")
+
+
+# Building blocks for the inline NZBs below.
+xml_declaration = b'<?xml version="1.0" encoding="iso-8859-1" ?>\n'
+doctype = b'<!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">\n'
+nzb_open = b'<nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">\n'
+nzb_close = b"</nzb>"
+head_block = b"""\
     <head>
         <meta type="title">Your File!</meta>
-        <meta type="password">secret</meta>
-        <meta type="tag">HD</meta>
-        <meta type="category">TV</meta>
     </head>
-    <file poster="Joe Bloggs &lt;bloggs@nowhere.example&gt;" date="1071674882" subject="Here's your file!  abc-mr2a.r01 (1/2)">
+"""
+file_open = (
+    b'    <file poster="Joe Bloggs &lt;bloggs@nowhere.example&gt;" date="1071674882" subject="abc-mr2a.r01 (1/1)">\n'
+)
+groups_block = b"""\
         <groups>
             <group>alt.binaries.newzbin</group>
-            <group>alt.binaries.mojo</group>
         </groups>
+"""
+segments_block = b"""\
         <segments>
             <segment bytes="102394" number="1">123456789abcdef@news.newzbin.com</segment>
-            <segment bytes="4501" number="2">987654321fedbca@news.newzbin.com</segment>
         </segments>
-    </file>
 """
-
-valid_xml_but_invalid_nzb = """\
-<?xml version="1.0" encoding="iso-8859-1" ?>
-<!DOCTYPE nzb PUBLIC "-//newzBin//DTD NZB 1.1//EN" "http://www.newzbin.com/DTD/nzb/nzb-1.1.dtd">
-<nzb xmlns="http://www.newzbin.com/DTD/2003/nzb">
-    <head>
-        <meta type="title">Your File!</meta>
-    </head>
-    <file poster="Joe Bloggs &lt;bloggs@nowhere.example&gt;" date="1071674882" subject="Here's your file!  abc-mr2a.r01 (1/2)">
-        <groups>
-            <group>alt.binaries.newzbin</group>
-            <group>alt.binaries.mojo</group>
-        </groups>
-    </file>
-</nzb>"""
+file_close = b"    </file>\n"
+
+# Never closes the <nzb>.
+invalid_xml = xml_declaration + doctype + nzb_open + head_block + file_open + groups_block + segments_block + file_close
+
+# The <file> has no <segments>.
+valid_xml_but_invalid_nzb = (
+    xml_declaration + doctype + nzb_open + head_block + file_open + groups_block + file_close + nzb_close
+)
+
+nzb_with_entity = (
+    xml_declaration
+    + b'<!DOCTYPE nzb [<!ENTITY poster "Joe Bloggs">]>\n'
+    + nzb_open
+    + b'    <file poster="&poster;" date="1071674882" subject="abc-mr2a.r01 (1/1)">\n'
+    + groups_block
+    + segments_block
+    + file_close
+    + nzb_close
+)
+
+
+def make_nzb(
+    *,
+    poster: str | None = "Joe Bloggs",
+    date: str | None = "1071674882",
+    subject: str | None = "abc-mr2a.r01 (1/1)",
+) -> bytes:
+    """Single file NZB, with only the given (non-None) attributes set on the <file>."""
+    attributes = {"poster": poster, "date": date, "subject": subject}
+    file_attributes = b"".join(
+        b' %s="%s"' % (key.encode(), value.encode()) for key, value in attributes.items() if value is not None
+    )
+    nzb = (
+        xml_declaration,
+        nzb_open,
+        b"    <file%s>\n" % file_attributes,
+        groups_block,
+        segments_block,
+        file_close,
+        nzb_close,
+    )
+    return b"".join(nzb)
 
 
 def test_invalid_nzb_error() -> None:
@@ -56,9 +118,9 @@ def test_invalid_nzb_error() -> None:
         assert repr(error) == 'InvalidNZBError("Missing something in the NZB")'
 
 
-def test_saving_without_filename() -> None:
+def test_saving_without_filename(nzb_files: NZBFiles) -> None:
     with pytest.raises(FileNotFoundError):
-        NZBMetaEditor((nzbs / "spec_example.nzb").read_text()).save()
+        NZBMetaEditor(nzb_files.read("spec_example.nzb").decode()).save()
 
 
 def test_saving_overwrite() -> None:
@@ -67,27 +129,94 @@ def test_saving_overwrite() -> None:
 
 
 def test_parsing_invalid_nzb() -> None:
-    with pytest.raises(InvalidNZBError):
+    with raises_with(InvalidNZBError, lambda e: xml_error.match(e.message) is not None):
         NZBParser(invalid_xml).parse()
 
-    with pytest.raises(InvalidNZBError):
+    with raises_with(InvalidNZBError, lambda e: e.message == segments_error):
         NZBParser(valid_xml_but_invalid_nzb).parse()
 
 
+def test_parsing_nzb_with_entity() -> None:
+    with raises_with(InvalidNZBError, lambda e: e.message == entity_error):
+        NZBParser(nzb_with_entity).parse()
+
+    with raises_with(InvalidNZBError, lambda e: e.message == entity_error):
+        NZBMetaEditor(nzb_with_entity.decode())
+
+
+@pytest.mark.parametrize(
+    "nzb",
+    [
+        '<nzb xmlns="http://www.newzbin.com/DTD/2003/nzb"/>',
+        '<nzb xmlns="http://www.newzbin.com/DTD/2003/nzb"></nzb>',
+        "<rss><head></head><file/></rss>",
+    ],
+    ids=["self-closing", "empty", "not-nzb"],
+)
+def test_editing_nzb_with_invalid_root(nzb: str) -> None:
+    with raises_with(InvalidNZBError, lambda e: e.message == "Missing or malformed <nzb>...</nzb>!"):
+        NZBMetaEditor(nzb)
+
+
 def test_editing_invalid_nzb() -> None:
-    with pytest.raises(InvalidNZBError):
-        NZBMetaEditor(invalid_xml)
+    with raises_with(InvalidNZBError, lambda e: xml_error.match(e.message) is not None):
+        NZBMetaEditor(invalid_xml.decode())
+
+
+@pytest.mark.parametrize(
+    ("nzb_file", "error"),
+    [
+        ("malformed_files.nzb", files_error),
+        ("malformed_files2.nzb", groups_error),
+        ("malformed_groups.nzb", groups_error),
+        ("malformed_segments.nzb", segments_error),
+    ],
+)
+def test_parser_exceptions(nzb_file: str, error: str, nzb_files: NZBFiles) -> None:
+    with raises_with(InvalidNZBError, lambda e: e.message == error):
+        NZBParser(nzb_files.read(nzb_file)).parse()
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda data: data[:-16],  # Truncated
+        lambda data: data[:20] + b"\xff" * 8 + data[28:],  # Garbage in the deflate stream, right after the header
+    ],
+    ids=["truncated", "corrupted"],
+)
+def test_parsing_broken_gzip(corrupt: Callable[[bytes], bytes], tmp_path: Path, nzb_files: NZBFiles) -> None:
+    broken = tmp_path / "broken.nzb.gz"
+    broken.write_bytes(corrupt(nzb_files.read("spec_example.nzb.gz")))
+
+    with raises_with(InvalidNZBError, lambda e: e.message.startswith("Gzip decompression error for file")):
+        NZBParser.from_file(broken).parse()
+
+
+def test_parsing_missing_file() -> None:
+    with pytest.raises(FileNotFoundError):
+        NZBParser.from_file(nzbs / "does_not_exist.nzb")
+
 
+@pytest.mark.parametrize(
+    ("nzb", "error"),
+    [
+        (make_nzb(poster=None), "Missing or malformed 'poster' attribute in <file>...</file>!"),
+        (make_nzb(date=None), "Missing or malformed 'date' attribute in <file>...</file>!"),
+        (make_nzb(subject=None), "Missing or malformed 'subject' attribute in <file>...</file>!"),
+        (make_nzb(date="yesterday"), files_error),
+    ],
+)
+def test_parsing_invalid_file_attributes(nzb: bytes, error: str) -> None:
+    with raises_with(InvalidNZBError, lambda e: e.message == error):
+        NZBParser(nzb).parse()
 
-def test_parser_exceptions() -> None:
-    with pytest.raises(InvalidNZBError):
-        NZBParser.from_file(nzbs / "malformed_files.nzb").parse()
 
-    with pytest.raises(InvalidNZBError):
-        NZBParser.from_file(nzbs / "malformed_files2.nzb").parse()
+def test_parsing_nzb_bytes() -> None:
+    assert NZBParser(make_nzb()).parse().file.poster == "Joe Bloggs"
 
-    with pytest.raises(InvalidNZBError):
-        NZBParser.from_file(nzbs / "malformed_groups.nzb").parse()
 
-    with pytest.raises(InvalidNZBError):
-        NZBParser.from_file(nzbs / "malformed_segments.nzb").parse()
+def test_parsing_invalid_segment_number() -> None:
+    nzb = make_nzb().replace(b'number="1"', b'number="abc"')
+    with raises_with(InvalidNZBError, lambda e: e.message == files_error):
+        NZBParser(nzb).parse()